@@ -1,24 +1,61 @@
 from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import json
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel
+import hashlib
+import heapq
+import os
 import re
+
+# Pin the BLAS/OpenMP thread pools before numpy/torch are imported, dividing
+# the cores across uvicorn workers (WEB_CONCURRENCY) so the math libraries
+# don't oversubscribe them. Export the variables beforehand to override.
+_blas_threads = str(max(1, (os.cpu_count() or 1)
+                        // max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))))
+os.environ.setdefault('OMP_NUM_THREADS', _blas_threads)
+os.environ.setdefault('OPENBLAS_NUM_THREADS', _blas_threads)
+os.environ.setdefault('MKL_NUM_THREADS', _blas_threads)
+
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import os
-import pickle
+import threading
 from fastapi import Body
 
+# SimSIMD provides SIMD-accelerated (AVX-512/NEON) cosine kernels; fall back
+# to plain NumPy if it is not installed
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# Numba lets us fuse dot product, threshold and top-k into one compiled pass;
+# the chunked NumPy path below remains the fallback
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# orjson parses the drugs corpus a few times faster than the stdlib at startup
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Compiled once at import so hot paths skip pattern re-parsing
+_RE_NONWORD = re.compile(r'[^\w\s.,;:!?\-]')  # special chars except basic punctuation
+_RE_WS = re.compile(r'\s+')
+
 def clean_text(text: str) -> str:
     """Clean text by removing extra spaces, newlines, and special characters."""
     if not isinstance(text, str):
         return ""
-    # Remove special characters but keep basic punctuation and letters
-    text = re.sub(r'[^\w\s.,;:!?\-]', ' ', text)
-    # Replace multiple spaces with a single space
-    text = re.sub(r'\s+', ' ', text)
+    text = _RE_NONWORD.sub(' ', text)
+    text = _RE_WS.sub(' ', text)
     return text.strip()
 
 app = FastAPI(title="Medicine Recommendation API",
@@ -35,31 +72,115 @@ app.add_middleware(
 
 # Initialize the sentence transformer model
 MODEL_NAME = 'all-MiniLM-L6-v2'  # Lightweight model good for semantic similarity
-EMBEDDINGS_CACHE = 'medicine_embeddings.pkl'
+# Embedding cache: .npy files are loaded with mmap_mode='r' so the OS
+# page-caches them and uvicorn workers share one copy instead of each
+# deserializing a pickle into its own heap
+CACHE_META_FILE = 'medicine_cache_meta.json'
+CACHE_EMBEDDINGS_Q8 = 'medicine_embeddings_q8.npy'
+CACHE_EMBEDDING_SCALES = 'medicine_embedding_scales.npy'
+CACHE_SIDE_EFFECTS_EMB = 'side_effects_embeddings.npy'
+# Bump this whenever the cached embedding format changes so stale caches are regenerated
+EMBEDDINGS_CACHE_VERSION = 6
+
+# Optional quantized ONNX export of the MiniLM model (see README for the
+# optimum-cli commands); used instead of SBERT when the directory exists
+ONNX_MODEL_DIR = 'onnx_q'
+
+class ONNXEncoder:
+    """Drop-in replacement for SentenceTransformer.encode backed by ONNX Runtime.
+
+    Loads an Optimum export (typically int8-quantized) of the MiniLM model,
+    then tokenizes, runs the session, mean-pools over the attention mask and
+    optionally L2-normalizes — matching SBERT's pipeline for this model while
+    skipping the PyTorch Python overhead on short queries.
+    """
+
+    def __init__(self, model_dir: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        pooled_batches = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            inputs = self.tokenizer(batch, padding=True, truncation=True,
+                                    return_tensors='np')
+            hidden = np.asarray(self.model(**inputs).last_hidden_state)
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled_batches.append(pooled)
+        vectors = np.concatenate(pooled_batches).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.maximum(
+                np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+def _load_encoder():
+    """Prefer the quantized ONNX export when present; fall back to SBERT."""
+    if os.path.isdir(ONNX_MODEL_DIR):
+        try:
+            encoder = ONNXEncoder(ONNX_MODEL_DIR)
+            print(f"Loaded ONNX encoder from {ONNX_MODEL_DIR}")
+            return encoder
+        except Exception as e:
+            print(f"Could not load ONNX encoder: {e}. Falling back to SentenceTransformer.")
+    encoder = SentenceTransformer(MODEL_NAME)
+    if torch.cuda.is_available():
+        # fp16 on GPU makes batched encodes several times faster and leaves
+        # headroom for larger dynamic batches; SBERT still returns float32
+        encoder = encoder.to('cuda').half()
+    return encoder
+
+def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with a per-row scale.
+
+    Returns the quantized array and the float32 scales needed to map int8
+    dot products back to (approximate) float similarities.
+    """
+    scales = np.abs(vectors).max(axis=-1, keepdims=True) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    quantized = np.round(vectors / scales).astype(np.int8)
+    return np.ascontiguousarray(quantized), scales
 
 # Load or initialize the model and embeddings
-def load_or_create_embeddings() -> Tuple[SentenceTransformer, Dict[str, Any]]:
+def load_or_create_embeddings() -> Tuple[Any, Dict[str, Any]]:
     """Load or create embeddings for the medicines data."""
-    model = SentenceTransformer(MODEL_NAME)
-    
+    model = _load_encoder()
+
     # Load medicines data
-    with open('drugs_data.json', 'r', encoding='utf-8') as f:
-        try:
-            medicines_data = json.load(f)
-        except json.JSONDecodeError:
-            content = f.read()
-            content = re.sub(r'\s+', ' ', content)
-            content = re.sub(r'\([^)]*\)', '', content)
-            medicines_data = json.loads(content)
+    with open('drugs_data.json', 'rb') as f:
+        raw = f.read()
+    medicines_data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    # Fingerprint the corpus so a cache built from an older drugs_data.json
+    # is never paired with the freshly parsed data
+    corpus_digest = hashlib.sha256(raw).hexdigest()
     
     # Check if we have cached embeddings
-    if os.path.exists(EMBEDDINGS_CACHE):
+    if os.path.exists(CACHE_META_FILE):
         try:
-            with open(EMBEDDINGS_CACHE, 'rb') as f:
-                embeddings_data = pickle.load(f)
-            print("Loaded embeddings from cache")
-            return model, embeddings_data
-        except (pickle.UnpicklingError, EOFError, KeyError) as e:
+            with open(CACHE_META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (meta.get('version') == EMBEDDINGS_CACHE_VERSION
+                    and meta.get('corpus_digest') == corpus_digest):
+                embeddings_data = {
+                    'version': meta['version'],
+                    'medicines': medicines_data,
+                    'cleaned_medicines': meta['cleaned_medicines'],
+                    'texts': meta['texts'],
+                    'embeddings_q8': np.load(CACHE_EMBEDDINGS_Q8, mmap_mode='r'),
+                    'embedding_scales': np.load(CACHE_EMBEDDING_SCALES, mmap_mode='r'),
+                    'side_effects_embeddings': np.load(CACHE_SIDE_EFFECTS_EMB, mmap_mode='r'),
+                }
+                print("Loaded embeddings from cache")
+                return model, embeddings_data
+            print("Cached embeddings don't match the current format or corpus. Regenerating...")
+        except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
             print(f"Error loading cached embeddings: {e}. Regenerating...")
     
     print("Generating new embeddings...")
@@ -69,20 +190,63 @@ def load_or_create_embeddings() -> Tuple[SentenceTransformer, Dict[str, Any]]:
         med_text = f"{med.get('drug_name', '')} {med.get('medical_condition', '')} {med.get('side_effects', '')}"
         texts.append(clean_text(med_text))
     
-    # Generate embeddings
+    # Generate embeddings and L2-normalize them once so cosine similarity at
+    # request time is a plain dot product (float32 halves memory bandwidth too)
     embeddings = model.encode(texts, convert_to_numpy=True)
-    
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True).clip(min=1e-12)
+
+    # Quantize to int8 with per-row scales: 4x less memory bandwidth on the
+    # dot product, and SimSIMD can use VNNI int8 kernels on the quantized rows
+    embeddings_q8, embedding_scales = _quantize_int8(embeddings)
+
+    # Pre-clean every corpus field once; the request handlers then never run
+    # regex cleaning on the hot path
+    cleaned_medicines = []
+    for med in medicines_data:
+        cleaned = {
+            'drug_name': clean_text(med.get('drug_name', 'Unknown')),
+            'medical_condition': clean_text(med.get('medical_condition', '')),
+            'side_effects': clean_text(med.get('side_effects', '')),
+            'rating': clean_text(med.get('rating', 'N/A')),
+            'drug_link': clean_text(med.get('drug_link', '')),
+        }
+        cleaned['drug_name_lower'] = cleaned['drug_name'].lower()
+        cleaned['medical_condition_lower'] = cleaned['medical_condition'].lower()
+        cleaned['side_effects_lower'] = cleaned['side_effects'].lower()
+        cleaned_medicines.append(cleaned)
+
+    # Also pre-embed every medicine's side-effects text so the allergy-risk
+    # check at request time is a lookup plus a dot product, never an encode
+    se_texts = [cleaned['side_effects_lower'] for cleaned in cleaned_medicines]
+    side_effects_embeddings = np.ascontiguousarray(
+        model.encode(se_texts, batch_size=64, convert_to_numpy=True,
+                     normalize_embeddings=True),
+        dtype=np.float32)
+
     # Store the embeddings with the original data
     embeddings_data = {
+        'version': EMBEDDINGS_CACHE_VERSION,
         'medicines': medicines_data,
-        'embeddings': embeddings,
+        'cleaned_medicines': cleaned_medicines,
+        'embeddings_q8': embeddings_q8,
+        'embedding_scales': embedding_scales,
+        'side_effects_embeddings': side_effects_embeddings,
         'texts': texts
     }
     
-    # Cache the embeddings
+    # Cache the embeddings: arrays as .npy (mmap-able), metadata as JSON
     try:
-        with open(EMBEDDINGS_CACHE, 'wb') as f:
-            pickle.dump(embeddings_data, f)
+        np.save(CACHE_EMBEDDINGS_Q8, embeddings_q8)
+        np.save(CACHE_EMBEDDING_SCALES, embedding_scales)
+        np.save(CACHE_SIDE_EFFECTS_EMB, side_effects_embeddings)
+        with open(CACHE_META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': EMBEDDINGS_CACHE_VERSION,
+                'corpus_digest': corpus_digest,
+                'cleaned_medicines': cleaned_medicines,
+                'texts': texts
+            }, f)
         print("Generated and cached new embeddings")
     except Exception as e:
         print(f"Warning: Could not cache embeddings: {e}")
@@ -92,7 +256,10 @@ def load_or_create_embeddings() -> Tuple[SentenceTransformer, Dict[str, Any]]:
 # Load the model and data
 model, embeddings_data = load_or_create_embeddings()
 medicines_data = embeddings_data['medicines']
-embeddings = embeddings_data['embeddings']
+cleaned_medicines = embeddings_data['cleaned_medicines']
+embeddings_q8 = embeddings_data['embeddings_q8']
+embedding_scales = embeddings_data['embedding_scales']
+side_effects_embeddings = embeddings_data['side_effects_embeddings']
 
 class MedicineResponse(BaseModel):
     drug_name: str
@@ -112,22 +279,208 @@ class NLPSearchResponse(BaseModel):
     drug_link: Optional[str] = None
     confidence_score: float
 
-def semantic_search(query: str, top_k: int = 10, threshold: float = 0.3):
+# Dynamic batching for query encoding: concurrent requests enqueue their
+# strings and a single worker encodes them as one padded batch, instead of
+# each request running its own transformer forward pass on the event loop
+ENCODE_MAX_BATCH = 32
+ENCODE_MAX_WAIT_MS = 5
+QUERY_CACHE_MAXSIZE = 4096
+
+_encode_queue: Optional[asyncio.Queue] = None
+# Bounded LRU of text -> embedding bytes; repeated prompts skip the queue
+_query_cache: 'OrderedDict[str, bytes]' = OrderedDict()
+
+def _query_cache_put(text: str, blob: bytes) -> None:
+    _query_cache[text] = blob
+    _query_cache.move_to_end(text)
+    while len(_query_cache) > QUERY_CACHE_MAXSIZE:
+        _query_cache.popitem(last=False)
+
+def _to_blob(vector: np.ndarray) -> bytes:
+    return np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+
+async def _encode_worker():
+    """Drain queued texts and encode them in batches, resolving each future."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _encode_queue.get()]
+        # Wait a short window for more requests to coalesce into the batch
+        deadline = loop.time() + ENCODE_MAX_WAIT_MS / 1000.0
+        while len(batch) < ENCODE_MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_encode_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await asyncio.to_thread(
+                model.encode, texts, batch_size=len(texts),
+                convert_to_numpy=True, normalize_embeddings=True)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(_to_blob(vector))
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+async def encode_query(text: str) -> np.ndarray:
+    """Return the normalized float32 embedding for a query string.
+
+    Cache hits return immediately; misses are funneled through the batching
+    worker so concurrent requests share one transformer forward pass.
+    """
+    blob = _query_cache.get(text)
+    if blob is None:
+        if _encode_queue is None:
+            # Worker not running (e.g. scripts importing the module directly)
+            vector = await asyncio.to_thread(
+                model.encode, text, convert_to_numpy=True, normalize_embeddings=True)
+            blob = _to_blob(vector)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            await _encode_queue.put((text, future))
+            blob = await future
+        _query_cache_put(text, blob)
+    else:
+        _query_cache.move_to_end(text)
+    return np.frombuffer(blob, dtype=np.float32)
+
+@app.on_event("startup")
+async def _start_encode_worker():
+    global _encode_queue
+    _encode_queue = asyncio.Queue()
+    asyncio.create_task(_encode_worker())
+
+# Rows scored per block; ~256 int8 rows at dim 384 stay resident in L2
+# while the query vector is reused across the whole block
+SCORE_CHUNK_ROWS = 256
+
+# Scratch buffer reused by every scoring pass (guarded by _score_lock) so the
+# hot path allocates nothing once warmed up; queries arrive from encode_query
+# already 1-D, normalized, float32 and contiguous, so no reshape/copy either
+_score_lock = threading.Lock()
+_block_scores = np.empty(SCORE_CHUNK_ROWS, dtype=np.float32)
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=True)
+    def _topk_q8_kernel(matrix, row_scales, query_q8, query_scale, k, threshold):
+        """Fused int8 dot product + threshold + top-k in a single pass.
+
+        Maintains a fixed-size min-heap in two flat arrays, so no
+        intermediate similarity vector is ever materialized.
+        """
+        n_rows, dim = matrix.shape
+        heap_scores = np.empty(k, dtype=np.float32)
+        heap_idx = np.empty(k, dtype=np.int64)
+        heap_size = 0
+        for i in range(n_rows):
+            acc = np.int32(0)
+            for j in range(dim):
+                acc += np.int32(matrix[i, j]) * np.int32(query_q8[j])
+            score = np.float32(acc * row_scales[i] * query_scale)
+            if score < threshold:
+                continue
+            if heap_size < k:
+                # Push onto the min-heap
+                child = heap_size
+                heap_scores[child] = score
+                heap_idx[child] = i
+                heap_size += 1
+                while child > 0:
+                    parent = (child - 1) // 2
+                    if heap_scores[child] < heap_scores[parent]:
+                        heap_scores[child], heap_scores[parent] = \
+                            heap_scores[parent], heap_scores[child]
+                        heap_idx[child], heap_idx[parent] = \
+                            heap_idx[parent], heap_idx[child]
+                        child = parent
+                    else:
+                        break
+            elif score > heap_scores[0]:
+                # Replace the root and sift down
+                heap_scores[0] = score
+                heap_idx[0] = i
+                parent = 0
+                while True:
+                    left = 2 * parent + 1
+                    right = left + 1
+                    smallest = parent
+                    if left < heap_size and heap_scores[left] < heap_scores[smallest]:
+                        smallest = left
+                    if right < heap_size and heap_scores[right] < heap_scores[smallest]:
+                        smallest = right
+                    if smallest == parent:
+                        break
+                    heap_scores[parent], heap_scores[smallest] = \
+                        heap_scores[smallest], heap_scores[parent]
+                    heap_idx[parent], heap_idx[smallest] = \
+                        heap_idx[smallest], heap_idx[parent]
+                    parent = smallest
+        return heap_idx[:heap_size], heap_scores[:heap_size]
+
+def _corpus_topk(query_vec: np.ndarray, k: int, threshold: float) -> List[Tuple[int, float]]:
+    """Top-k cosine matches of a normalized 1-D query against the quantized corpus.
+
+    The query is quantized like the corpus rows and scored block by block so
+    each tile stays cache-resident; int8 dot products are rescaled by the
+    product of the scales into a preallocated buffer. A running min-heap
+    keeps only k (index, score) pairs alive across blocks; rows below the
+    threshold never enter it. Results are sorted by descending score.
+    """
+    query_q8, query_scale = _quantize_int8(query_vec)
+    # _quantize_int8 keeps the scale axis even for a 1-D query, so pull out
+    # the scalar; float() on a shape-(1,) array raises on current NumPy
+    q_scale = float(query_scale[0])
+    if numba is not None:
+        idxs, scores = _topk_q8_kernel(embeddings_q8, embedding_scales[:, 0],
+                                       query_q8, q_scale, k, threshold)
+        order = np.argsort(-scores)
+        return [(int(idxs[o]), float(scores[o])) for o in order]
+    query_row = query_q8.reshape(1, -1)
+    heap: List[Tuple[float, int]] = []
+    n_rows = embeddings_q8.shape[0]
+    with _score_lock:
+        for start in range(0, n_rows, SCORE_CHUNK_ROWS):
+            block = embeddings_q8[start:start + SCORE_CHUNK_ROWS]
+            rows = block.shape[0]
+            scores = _block_scores[:rows]
+            if simsimd is not None:
+                dots = np.asarray(simsimd.cdist(query_row, block, metric='dot'),
+                                  dtype=np.float32)[0]
+            else:
+                dots = np.einsum('ij,j->i', block, query_q8, dtype=np.int32)
+            np.multiply(dots, embedding_scales[start:start + rows, 0], out=scores)
+            scores *= q_scale
+            for offset in np.flatnonzero(scores >= threshold):
+                item = (float(scores[offset]), start + int(offset))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item[0] > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+    return [(idx, score) for score, idx in sorted(heap, reverse=True)]
+
+def _allergy_risks(candidate_idxs: np.ndarray, allergy_vec: np.ndarray) -> np.ndarray:
+    """Allergy similarity of each candidate's side effects: a gather plus a GEMV."""
+    return side_effects_embeddings[candidate_idxs] @ allergy_vec
+
+async def semantic_search(query: str, top_k: int = 10, threshold: float = 0.3):
     """
     Perform semantic search on the medicines database.
     Returns indices of the top_k most similar medicines with similarity scores.
     """
-    # Encode the query
-    query_embedding = model.encode(query, convert_to_numpy=True).reshape(1, -1)
-    
-    # Calculate cosine similarity
-    similarities = cosine_similarity(query_embedding, embeddings)[0]
-    
-    # Get top_k results above threshold
-    top_indices = np.argsort(similarities)[::-1][:top_k]
-    top_indices = [i for i in top_indices if similarities[i] >= threshold]
-    
-    return [(i, float(similarities[i])) for i in top_indices]
+    k = min(top_k, embeddings_q8.shape[0])
+    if k <= 0:
+        return []
+
+    # Encode the query (cached and batched across concurrent requests), then
+    # run the scoring pass in the threadpool so it never blocks the event loop
+    query_embedding = await encode_query(query)
+
+    return await run_in_threadpool(_corpus_topk, query_embedding, k, threshold)
 
 # Mock region and pharmacy data
 MOCK_REGIONS = [
@@ -158,6 +511,13 @@ MOCK_PHARMACIES = {
     ]
 }
 
+# Region code -> lowercase medicine names, so availability checks are a
+# single hash lookup instead of scanning every pharmacy's list
+REGION_MED_SET = {
+    code: {name.lower() for pharmacy in pharmacies for name in pharmacy['available_medicines']}
+    for code, pharmacies in MOCK_PHARMACIES.items()
+}
+
 @app.get("/regions")
 async def get_regions():
     """Return a list of available regions (mocked)."""
@@ -178,38 +538,39 @@ async def get_medicines(
 ):
     try:
         query = f"Medicine for {symptom} but not for someone with {allergy} allergy"
-        results = semantic_search(query, top_k=top_k * 2, threshold=min_confidence)
+        results = await semantic_search(query, top_k=top_k * 2, threshold=min_confidence)
+        candidates = [(idx, score) for idx, score in results
+                      if all(key in medicines_data[idx]
+                             for key in ['drug_name', 'medical_condition', 'side_effects'])]
+
+        # Encode the allergy once; the side-effects embeddings are precomputed
+        # at startup, so the allergy similarities are a gather plus one GEMV
+        allergy_similarities = np.empty(0, dtype=np.float32)
+        if candidates:
+            allergy_embedding = await encode_query(allergy)
+            candidate_idxs = np.array([idx for idx, _ in candidates])
+            allergy_similarities = await run_in_threadpool(
+                _allergy_risks, candidate_idxs, allergy_embedding)
+
+        # Apply the risk threshold and the top_k cut in one vectorized step;
+        # the loop below only builds response dicts for the final results
+        kept = np.flatnonzero(allergy_similarities <= 0.4)[:top_k]
+        region_meds = REGION_MED_SET.get(region, set()) if region else None
         filtered_medicines = []
-        for idx, score in results:
-            med = medicines_data[idx]
-            if not all(key in med for key in ['drug_name', 'medical_condition', 'side_effects']):
-                continue
-            med_condition = clean_text(med.get('medical_condition', '')).lower()
-            side_effects = clean_text(med.get('side_effects', '')).lower()
-            drug_name = clean_text(med.get('drug_name', 'Unknown')).lower()
-            allergy_embedding = model.encode(allergy, convert_to_numpy=True).reshape(1, -1)
-            side_effects_embedding = model.encode(side_effects, convert_to_numpy=True).reshape(1, -1)
-            allergy_similarity = float(cosine_similarity(allergy_embedding, side_effects_embedding)[0][0])
-            if allergy_similarity > 0.4:
-                continue
-            # Region availability annotation
-            available_in_region = None
-            if region:
-                pharmacies = MOCK_PHARMACIES.get(region, [])
-                available_in_region = any(drug_name.capitalize() in p['available_medicines'] for p in pharmacies)
-            response_med = {
-                'drug_name': clean_text(med.get('drug_name', 'Unknown')),
-                'medical_condition': med_condition,
-                'side_effects': side_effects,
-                'rating': clean_text(med.get('rating', 'N/A')),
-                'drug_link': clean_text(med.get('drug_link', '')),
+        for j in kept:
+            idx, score = candidates[j]
+            cleaned = cleaned_medicines[idx]
+            filtered_medicines.append({
+                'drug_name': cleaned['drug_name'],
+                'medical_condition': cleaned['medical_condition_lower'],
+                'side_effects': cleaned['side_effects_lower'],
+                'rating': cleaned['rating'],
+                'drug_link': cleaned['drug_link'],
                 'confidence_score': score,
-                'allergy_risk': allergy_similarity,
-                'available_in_region': available_in_region
-            }
-            filtered_medicines.append(response_med)
-            if len(filtered_medicines) >= top_k:
-                break
+                'allergy_risk': float(allergy_similarities[j]),
+                'available_in_region': (cleaned['drug_name_lower'] in region_meds
+                                        if region_meds is not None else None)
+            })
         return filtered_medicines
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
@@ -220,16 +581,16 @@ async def nlp_search(request: NLPSearchRequest, top_k: int = 3):
     Perform semantic search using a free-form NLP prompt and return the top matches from the drugs database.
     """
     try:
-        results = semantic_search(request.prompt, top_k=top_k)
+        results = await semantic_search(request.prompt, top_k=top_k)
         matches = []
         for idx, score in results:
-            med = medicines_data[idx]
+            cleaned = cleaned_medicines[idx]
             matches.append({
-                'drug_name': clean_text(med.get('drug_name', 'Unknown')),
-                'medical_condition': clean_text(med.get('medical_condition', '')),
-                'side_effects': clean_text(med.get('side_effects', '')),
-                'rating': clean_text(med.get('rating', 'N/A')),
-                'drug_link': clean_text(med.get('drug_link', '')),
+                'drug_name': cleaned['drug_name'],
+                'medical_condition': cleaned['medical_condition'],
+                'side_effects': cleaned['side_effects'],
+                'rating': cleaned['rating'],
+                'drug_link': cleaned['drug_link'],
                 'confidence_score': score
             })
         return matches